@@ -1,9 +1,14 @@
 """Standalone MAQUA membership service."""
 from __future__ import annotations
 
+import functools
 import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime, timedelta
-from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
 
 from flask import Flask, jsonify, render_template, request
 
@@ -44,9 +49,52 @@ PAYMENT_KEYWORD_LABELS: Sequence[tuple[str, str]] = (
     ("銀行扣賬", "自動扣款"),
 )
 
-STANDARD_DATE_RE = re.compile(r"(20\d{2})[./-](\d{1,2})[./-](\d{1,2})")
-CJK_DATE_RE = re.compile(r"(20\d{2})年\s*(\d{1,2})月\s*(\d{1,2})[日號]?")
+# 付款方式關鍵字合併為單一交替式正則，一次掃描取代逐一子字串比對；
+# 前瞻群組讓重疊的關鍵字都被看見（如「自動轉賬」內含的「轉賬」），
+# 再依宣告順序決定優先權，維持與逐一比對相同的標籤選擇
+_PAYMENT_NEEDLE_TO_LABEL: Dict[str, str] = dict(PAYMENT_KEYWORD_LABELS)
+_PAYMENT_NEEDLE_PRIORITY: Dict[str, int] = {}
+for _idx, (_needle, _) in enumerate(PAYMENT_KEYWORD_LABELS):
+    _PAYMENT_NEEDLE_PRIORITY.setdefault(_needle, _idx)
+del _idx, _needle
+_PAYMENT_PATTERN = re.compile(
+    "(?=("
+    + "|".join(
+        re.escape(needle)
+        for needle in sorted(_PAYMENT_NEEDLE_TO_LABEL, key=len, reverse=True)
+    )
+    + "))"
+)
+
+# 同一關鍵字短時間內重複查詢（UI 重試、客服重查）直接回傳已組好的檔案，
+# 避免重打多個 CRM 接口；只快取成功結果。
+PROFILE_CACHE_TTL_SECONDS = 60
+_PROFILE_CACHE: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_PROFILE_CACHE_LOCK = threading.Lock()
+
+# 客戶詳情跨請求快取：同一 (customer_id, org_id) 五分鐘內重查直接命中
+CUSTOMER_DETAIL_CACHE_TTL_SECONDS = 300
+_DETAIL_CACHE_MAX_ENTRIES = 1024
+_DETAIL_CACHE: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+_DETAIL_CACHE_LOCK = threading.Lock()
+
+# 全形括號/冒號正規化表：translate 為 C 層單次掃描，取代多趟 str.replace
+_FULLWIDTH_PUNCT_TABLE = str.maketrans({"（": "(", "）": ")", "：": ":", "﹕": ":"})
+# 編碼正規化時要剔除的分隔字元（空白、連字號、底線）；
+# 空白須涵蓋 regex \s 的 Unicode 範圍（全形空格、NBSP 等），與舊版 re.sub 一致
+_CODE_STRIP_TABLE = str.maketrans(
+    "", "", "-_" + "".join(chr(cp) for cp in range(0x3001) if chr(cp).isspace())
+)
+
+# 標準（2024-01-02）與中文（2024年1月2日）日期格式合併為單一正則，
+# 一次掃描即可判斷/擷取；群組 1-3 為標準格式、4-6 為中文格式
+_ANY_DATE_RE = re.compile(
+    r"(?:(20\d{2})[./-](\d{1,2})[./-](\d{1,2}))|(?:(20\d{2})年\s*(\d{1,2})月\s*(\d{1,2})[日號]?)"
+)
+_PAREN_INNER_RE = re.compile(r"\(([^)]+)\)")
+_DATE_PREFIX_RE = re.compile(r"(\d{4})[-/](\d{1,2})[-/](\d{1,2})")
 CODE_TOKEN_RE = re.compile(r"\bC\d{2,}\b", re.IGNORECASE)
+_CUSTOMER_CODE_RE = re.compile(r"\bC\d+")
 TASK_OWNER_KEYWORD = getattr(config, "MAINTENANCE_TASK_OWNER_KEYWORD", "客服003")
 
 FOLLOWUP_SEARCH_FALLBACKS: Dict[str, Sequence[Tuple[str, str]]] = {
@@ -77,6 +125,76 @@ FOLLOWUP_SEARCH_FALLBACKS: Dict[str, Sequence[Tuple[str, str]]] = {
     ),
 }
 
+_NAME_PHONE_KEYS = frozenset(("name", "phone"))
+
+# 方案明細的顯示順序；未列出的標籤排在最後並保持插入順序
+PREFERRED_DETAIL_ORDER = (
+    "合約編號",
+    "方案類型",
+    "使用方式",
+    "付費方式",
+    "月費金額",
+    "合約開始日",
+    "合約結束日",
+    "合約年期",
+    "預計簽單金額",
+    "商機階段",
+    "方案負責人",
+    "交易類型",
+    "安裝位置",
+)
+_PREFERRED_DETAIL_INDEX = {label: index for index, label in enumerate(PREFERRED_DETAIL_ORDER)}
+
+# 商機欄位鍵組，模組層級建好讓每次建模重用同一批 tuple
+_PLAN_ID_KEYS = ("id", "oppt", "opptId", "opportunityId", "businessId")
+_PLAN_TITLE_KEYS = ("oppt_name", "name", "商機名稱")
+_PLAN_STAGE_KEYS = ("opptStage_name", "stageName", "商機階段")
+_PLAN_SUMMARY_KEYS = (
+    "planType",
+    "plan_type",
+    "方案類型",
+    "schemeName",
+    "productName",
+    "headDef!define9",
+    "opptDefineCharacter.attrext9",
+)
+_PLAN_ALT_SUMMARY_KEYS = ("solutionName", "方案名稱", "planName")
+_PLAN_USAGE_KEYS = ("usage", "useType", "使用方式", "headDef!define8", "opptDefineCharacter.attrext8")
+_PLAN_PAYMENT_KEYS = (
+    "paymentMethod",
+    "paymentMethodName",
+    "paymentWay",
+    "payWay_name",
+    "paywayName",
+    "目前付費方式",
+    "付款方式",
+)
+_PLAN_MONTHLY_KEYS = (
+    "monthlyFee",
+    "rentAmount",
+    "rent",
+    "月費金額",
+    "headDef!define10",
+    "headDef!define11",
+    "opptDefineCharacter.attrext12",
+    "opptDefineCharacter.attrext10",
+)
+_PLAN_MONTHLY_DETAIL_KEYS = ("monthlyFee", "rentAmount", "rent", "月費金額", "headDef!define11", "opptDefineCharacter.attrext12")
+_PLAN_CONTRACT_NO_KEYS = ("contractNo", "contractNumber", "合約編號", "合同編號", "headDef!define13", "opptDefineCharacter.attrext19")
+_PLAN_CONTRACT_NO_DETAIL_KEYS = ("contractNo", "contractNumber", "合同編號", "合約編號", "headDef!define13", "opptDefineCharacter.attrext19")
+_PLAN_CONTRACT_BEGIN_KEYS = ("contractBeginDate", "startDate", "合約開始日期", "開始日期", "headDef!define2", "opptDefineCharacter.attrext2")
+_PLAN_CONTRACT_END_KEYS = ("contractEndDate", "endDate", "合約結束日期", "結束日期", "headDef!define3", "opptDefineCharacter.attrext3")
+_PLAN_CONTRACT_TERM_KEYS = ("contractYear", "合約年期", "headDef!define4", "opptDefineCharacter.attrext4")
+_PLAN_DETAIL_URL_KEYS = ("pcUrl", "detailUrl", "detail_url", "url")
+_PLAN_EXPECT_AMOUNT_KEYS = ("expectSignMoney", "planAmount", "amount", "預計簽單金額")
+_PLAN_OWNER_KEYS = ("ownerName", "ower_name", "負責人")
+_PLAN_TRANS_TYPE_KEYS = ("opptTransType_name", "bustype_name", "交易類型")
+_PLAN_LOCATION_KEYS = ("installLocation", "address", "安裝位置")
+
+
+def _preferred_detail_key(item: Dict[str, str]) -> int:
+    return _PREFERRED_DETAIL_INDEX.get(item["label"], len(_PREFERRED_DETAIL_INDEX))
+
 
 class AmbiguousLookup(LookupError):
     def __init__(self, message: str, suggestions: Sequence[Dict[str, str]]):
@@ -84,6 +202,16 @@ class AmbiguousLookup(LookupError):
         self.suggestions = list(suggestions)
 
 
+def _dedupe_preserving_order(values: Sequence[str]) -> List[str]:
+    seen: Set[str] = set()
+    out: List[str] = []
+    for value in values:
+        if value not in seen:
+            seen.add(value)
+            out.append(value)
+    return out
+
+
 def _search_value_candidates(keyword: str, operator: Optional[str]) -> List[str]:
     text = str(keyword or "")
     trimmed = text.strip()
@@ -93,7 +221,7 @@ def _search_value_candidates(keyword: str, operator: Optional[str]) -> List[str]
     if text and text != trimmed:
         values.append(text)
     if not operator:
-        return list(dict.fromkeys(values)) or [text]
+        return _dedupe_preserving_order(values) or [text]
 
     op_lower = operator.lower()
     if trimmed:
@@ -106,7 +234,7 @@ def _search_value_candidates(keyword: str, operator: Optional[str]) -> List[str]
         elif op_lower == "likeright":
             wrapped = f"{trimmed}%"
             values.append(wrapped)
-    return list(dict.fromkeys(values)) or [trimmed or text]
+    return _dedupe_preserving_order(values) or [trimmed or text]
 
 
 def _fetch_followups(
@@ -121,14 +249,14 @@ def _fetch_followups(
     field = search_field or getattr(config, "FOLLOWUP_CUSTOMER_FIELD", "customer.name")
     candidates = _search_value_candidates(keyword, operator)
 
-    app.logger.info(f"_fetch_followups 開始搜索: keyword='{keyword}', field='{field}', operator='{operator}', candidates={candidates}")
+    app.logger.info("_fetch_followups 開始搜索: keyword='%s', field='%s', operator='%s', candidates=%s", keyword, field, operator, candidates)
 
     last_records: List[Dict[str, Any]] = []
     for candidate in candidates:
         if not candidate:
             continue
         try:
-            app.logger.info(f"嘗試搜索候選值: '{candidate}'")
+            app.logger.info("嘗試搜索候選值: '%s'", candidate)
             resp = CRM_CLIENT.get_followups(
                 keyword,
                 page=page,
@@ -137,7 +265,7 @@ def _fetch_followups(
                 search_operator=operator,
                 value_override=candidate,
             )
-            app.logger.info(f"CRM API 響應: {resp}")
+            app.logger.info("CRM API 響應: %s", resp)
         except Exception as exc:  # pragma: no cover - runtime logging
             app.logger.error(
                 "Followup search failed for %s (%s %s %s): %s",
@@ -149,15 +277,51 @@ def _fetch_followups(
             )
             continue
         record_list = resp.get("data", {}).get("recordList", []) or []
-        app.logger.info(f"獲得記錄數量: {len(record_list)}")
+        app.logger.info("獲得記錄數量: %s", len(record_list))
         if record_list:
             return record_list
         last_records = record_list
     
-    app.logger.info(f"搜索完成，最終返回記錄數量: {len(last_records)}")
+    app.logger.info("搜索完成，最終返回記錄數量: %s", len(last_records))
     return last_records
 
 
+def _fetch_followups_concurrently(
+    keyword: str,
+    attempts: Sequence[Tuple[str, str]],
+    *,
+    page: int = 1,
+    page_size: int = 20,
+) -> List[Dict[str, Any]]:
+    """並發執行多組 (field, operator) 候補搜索，按宣告順序取第一個非空結果。"""
+    if not attempts:
+        return []
+    executor = ThreadPoolExecutor(max_workers=min(8, len(attempts)))
+    try:
+        futures = [
+            executor.submit(
+                _fetch_followups,
+                keyword,
+                search_field=field,
+                search_operator=operator,
+                page=page,
+                page_size=page_size,
+            )
+            for field, operator in attempts
+        ]
+        # 依宣告的優先順序收結果，保持候補語義但讓網路請求重疊
+        for future in futures:
+            try:
+                records = future.result()
+            except Exception:  # pragma: no cover - runtime logging in worker
+                continue
+            if records:
+                return records
+        return []
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
 @app.route("/")
 def index() -> str:
     return render_template("index.html")
@@ -171,7 +335,7 @@ def profile_api():
         return jsonify({"message": "請輸入客戶編碼、電話或姓名"}), 400
 
     try:
-        profile = _build_member_profile(identifier)
+        profile = _cached_member_profile(identifier)
     except AmbiguousLookup as exc:
         return jsonify(
             {
@@ -190,6 +354,24 @@ def profile_api():
     return jsonify({"code": "OK", "profile": profile})
 
 
+def _cached_member_profile(identifier: str) -> Dict[str, Optional[str]]:
+    now = time.time()
+    with _PROFILE_CACHE_LOCK:
+        entry = _PROFILE_CACHE.get(identifier)
+        if entry and entry[0] > now:
+            return entry[1]
+
+    profile = _build_member_profile(identifier)
+
+    with _PROFILE_CACHE_LOCK:
+        # 順手清掉過期項目，避免快取無限增長
+        expired = [key for key, (expires_at, _) in _PROFILE_CACHE.items() if expires_at <= now]
+        for key in expired:
+            _PROFILE_CACHE.pop(key, None)
+        _PROFILE_CACHE[identifier] = (now + PROFILE_CACHE_TTL_SECONDS, profile)
+    return profile
+
+
 def _build_member_profile(identifier: str) -> Dict[str, Optional[str]]:
     normalized_identifier = str(identifier or "").strip()
     if not normalized_identifier:
@@ -200,20 +382,20 @@ def _build_member_profile(identifier: str) -> Dict[str, Optional[str]]:
     fallback_key: Optional[str] = None
 
     phone_mode = _looks_like_phone(normalized_identifier)
-    app.logger.info(f"搜索關鍵字: '{normalized_identifier}', 電話模式: {phone_mode}")
+    app.logger.info("搜索關鍵字: '%s', 電話模式: %s", normalized_identifier, phone_mode)
     
     if phone_mode:
         search_kwargs = {"search_field": "contactMobile", "search_operator": "like"}
         fallback_key = "phone"
-        app.logger.info(f"使用電話搜索模式: {search_kwargs}")
+        app.logger.info("使用電話搜索模式: %s", search_kwargs)
     elif _looks_like_customer_code(normalized_identifier):
         expected_code = normalized_identifier.upper()
-        app.logger.info(f"使用客戶編碼搜索: {expected_code}")
+        app.logger.info("使用客戶編碼搜索: %s", expected_code)
     else:
         # 對於姓名搜索，優先使用 customer.name 字段，這樣可以更好地匹配包含"中學"等關鍵字的客戶名稱
         search_kwargs = {"search_field": "customer.name", "search_operator": "like"}
         fallback_key = "name"
-        app.logger.info(f"使用姓名搜索模式: {search_kwargs}")
+        app.logger.info("使用姓名搜索模式: %s", search_kwargs)
 
     record_list: List[Dict[str, Any]] = _fetch_followups(
         normalized_identifier,
@@ -227,24 +409,23 @@ def _build_member_profile(identifier: str) -> Dict[str, Optional[str]]:
         tried: Set[Tuple[str, str]] = set()
         if search_kwargs:
             tried.add((search_kwargs.get("search_field") or "", search_kwargs.get("search_operator") or ""))
+        pending: List[Tuple[str, str]] = []
         for field, operator in FOLLOWUP_SEARCH_FALLBACKS.get(fallback_key, ()):
             key = (field, operator)
             if key in tried:
                 continue
             tried.add(key)
-            record_list = _fetch_followups(
-                normalized_identifier,
-                search_field=field,
-                search_operator=operator,
-                page=1,
-                page_size=20,
-            )
-            if record_list:
-                break
+            pending.append(key)
+        record_list = _fetch_followups_concurrently(
+            normalized_identifier,
+            pending,
+            page=1,
+            page_size=20,
+        )
 
     if record_list and not expected_code:
         candidate_suggestions = _build_suggestions(record_list)
-        if fallback_key in {"name", "phone"}:
+        if fallback_key in _NAME_PHONE_KEYS:
             if not candidate_suggestions:
                 raise LookupError("找不到符合條件的客戶資料")
             if len(candidate_suggestions) > 1:
@@ -289,11 +470,8 @@ def _build_member_profile(identifier: str) -> Dict[str, Optional[str]]:
         task_records,
     )
     latest_service_date = summary.get("latestServiceDate")
+    # summary 產出的 nextServiceDate 已含 +14 天緩衝，這裡直接取用
     next_service_date = summary.get("nextServiceDate")
-    if next_service_date:
-        parsed_next = _parse_follow_date(next_service_date)
-        if parsed_next:
-            next_service_date = (parsed_next + timedelta(days=14)).isoformat()
     payment_status = _resolve_payment_status(record_list)
     resolved_code = summary.get("customerCode") or target_code
 
@@ -306,8 +484,8 @@ def _build_member_profile(identifier: str) -> Dict[str, Optional[str]]:
     if not latest_record:
         raise LookupError("找不到符合條件的保養紀錄")
 
-    customer_id = str(latest_record.get("customer") or "")
-    org_id = str(latest_record.get("org") or "")
+    customer_id = _as_str(latest_record.get("customer"))
+    org_id = _as_str(latest_record.get("org"))
 
     detail_data: Dict[str, Any] = {}
     addresses: List[Dict[str, Any]] = []
@@ -318,9 +496,34 @@ def _build_member_profile(identifier: str) -> Dict[str, Optional[str]]:
 
     if detail_data:
         addresses = detail_data.get("merchantAddressInfos") or []
-        if (not addresses) and detail_data.get("code"):
-            addr_resp = CRM_CLIENT.get_addresses_by_codes([detail_data["code"]])
-            addresses = addr_resp.get("data") or []
+        if not addresses:
+            # 把所有可能的客戶編碼併成一次批量查詢，避免逐碼 RTT
+            needed_codes = _dedupe_preserving_order(
+                [
+                    code
+                    for code in (
+                        _clean_text(detail_data.get("code")),
+                        _clean_text(detail_data.get("customerCode")),
+                        _clean_text(latest_record.get("customer_code") or latest_record.get("customerCode")),
+                    )
+                    if code
+                ]
+            )
+            if needed_codes:
+                addr_resp = CRM_CLIENT.get_addresses_by_codes(needed_codes)
+                fetched = [entry for entry in (addr_resp.get("data") or []) if isinstance(entry, dict)]
+                addr_by_code: Dict[str, List[Dict[str, Any]]] = {}
+                for entry in fetched:
+                    entry_code = _clean_text(
+                        entry.get("code") or entry.get("merchantCode") or entry.get("customerCode")
+                    )
+                    if entry_code:
+                        addr_by_code.setdefault(entry_code, []).append(entry)
+                primary_code = _clean_text(detail_data.get("code"))
+                if primary_code and primary_code in addr_by_code:
+                    addresses = addr_by_code[primary_code]
+                else:
+                    addresses = fetched
 
     selected_address = None
     if isinstance(addresses, list) and addresses:
@@ -331,43 +534,43 @@ def _build_member_profile(identifier: str) -> Dict[str, Optional[str]]:
         if not selected_address:
             selected_address = addresses[0]
 
-    address_text = None
-    contact_name = None
-    contact_phone = None
+    if not isinstance(selected_address, dict):
+        selected_address = {}
 
-    if isinstance(selected_address, dict):
-        address_text = _resolve_text(
-            selected_address.get("mergerName")
-            or selected_address.get("address")
-            or selected_address.get("addressInfo")
-        )
-        contact_name = selected_address.get("receiver")
-        contact_phone = selected_address.get("mobile") or selected_address.get("telePhone")
-
-    if not address_text:
-        address_text = _resolve_text(detail_data.get("address"))
-    if not contact_name:
-        contact_name = detail_data.get("contactName")
-    if not contact_phone:
-        contact_phone = detail_data.get("contactTel") or detail_data.get("contactMobile")
+    address_text = _first_non_empty(
+        selected_address.get("mergerName"),
+        selected_address.get("address"),
+        selected_address.get("addressInfo"),
+        detail_data.get("address"),
+    )
+    contact_name = _first_non_empty(
+        selected_address.get("receiver"),
+        detail_data.get("contactName"),
+    )
+    contact_phone = _first_non_empty(
+        selected_address.get("mobile"),
+        selected_address.get("telePhone"),
+        detail_data.get("contactTel"),
+        detail_data.get("contactMobile"),
+    )
 
     recent_follow_info = _extract_recent_follow_info(detail_data)
     merchant_detail = detail_data.get("merchantAppliedDetail") if isinstance(detail_data, dict) else {}
     if not isinstance(merchant_detail, dict):
         merchant_detail = {}
-    contract_number = _first_non_empty(
-        detail_data.get("contractNumber"),
-        merchant_detail.get("contractNumber"),
-        merchant_detail.get("contractNo"),
-        merchant_detail.get("contractCode"),
-        merchant_detail.get("merchantApplyRangeId"),
-        merchant_detail.get("id"),
-        (detail_data.get("merchantDefine") or {}).get("define1") if isinstance(detail_data.get("merchantDefine"), dict) else None,
-        (detail_data.get("merchantCharacter") or {}).get("attrext21") if isinstance(detail_data.get("merchantCharacter"), dict) else None,
-        recent_follow_info.get("合約編號"),
-        recent_follow_info.get("合同編號"),
-        recent_follow_info.get("合同號"),
-        recent_follow_info.get("合約號"),
+    contract_number = _first_non_empty_lazy(
+        lambda: detail_data.get("contractNumber"),
+        lambda: merchant_detail.get("contractNumber"),
+        lambda: merchant_detail.get("contractNo"),
+        lambda: merchant_detail.get("contractCode"),
+        lambda: merchant_detail.get("merchantApplyRangeId"),
+        lambda: merchant_detail.get("id"),
+        lambda: _extract_nested(detail_data, "merchantDefine.define1"),
+        lambda: _extract_nested(detail_data, "merchantCharacter.attrext21"),
+        lambda: recent_follow_info.get("合約編號"),
+        lambda: recent_follow_info.get("合同編號"),
+        lambda: recent_follow_info.get("合同號"),
+        lambda: recent_follow_info.get("合約號"),
     )
     usage = _first_non_empty(
         detail_data.get("largeText1"),
@@ -471,7 +674,19 @@ def _resolve_text(value: Any) -> Optional[str]:
     return str(value)
 
 
+def _as_str(value: Any) -> str:
+    if type(value) is str:
+        return value
+    if value is None:
+        return ""
+    return str(value)
+
+
 def _clean_text(value: Any) -> Optional[str]:
+    # 快路徑：絕大多數欄位已是 str，跳過 _resolve_text 的 dict 分支
+    if type(value) is str:
+        stripped = value.strip()
+        return stripped or None
     text = _resolve_text(value)
     if text is None:
         return None
@@ -479,31 +694,37 @@ def _clean_text(value: Any) -> Optional[str]:
     return text or None
 
 
+def _first_non_empty_lazy(*getters: Callable[[], Any]) -> Optional[str]:
+    """同 _first_non_empty，但候選值延遲求值，首個命中後不再計算其餘。"""
+    for getter in getters:
+        text = _clean_text(getter())
+        if text:
+            return text
+    return None
+
+
 def _first_non_empty(*values: Any) -> Optional[str]:
     for value in values:
+        if type(value) is str:
+            stripped = value.strip()
+            if stripped:
+                return stripped
+            continue
         text = _clean_text(value)
         if text:
             return text
     return None
 
 
-def _extract_recent_follow_info(detail_data: Dict[str, Any]) -> Dict[str, str]:
-    result: Dict[str, str] = {}
-    merchant_detail = detail_data.get("merchantAppliedDetail") or {}
-    if not isinstance(merchant_detail, dict):
-        return result
-
-    content = merchant_detail.get("recentFollowContent")
-    text = _clean_text(content)
-    if not text:
-        return result
-
-    result["__raw__"] = text
+@functools.lru_cache(maxsize=512)
+def _parse_follow_lines(text: str) -> Dict[str, str]:
+    """將跟進內容逐行解析為鍵值對；同一客戶重複查詢時走快取。"""
+    result: Dict[str, str] = {"__raw__": text}
     for raw_line in text.replace("\r\n", "\n").split("\n"):
         line = raw_line.strip()
         if not line:
             continue
-        normalized = line.replace("：", ":", 1).replace("﹕", ":", 1)
+        normalized = line.translate(_FULLWIDTH_PUNCT_TABLE)
         if ":" not in normalized:
             continue
         key, value = normalized.split(":", 1)
@@ -514,6 +735,19 @@ def _extract_recent_follow_info(detail_data: Dict[str, Any]) -> Dict[str, str]:
     return result
 
 
+def _extract_recent_follow_info(detail_data: Dict[str, Any]) -> Dict[str, str]:
+    merchant_detail = detail_data.get("merchantAppliedDetail") or {}
+    if not isinstance(merchant_detail, dict):
+        return {}
+
+    content = merchant_detail.get("recentFollowContent")
+    text = _clean_text(content)
+    if not text:
+        return {}
+
+    return dict(_parse_follow_lines(text))
+
+
 def _detect_payment_method(detail_data: Dict[str, Any], follow_info: Dict[str, str]) -> Optional[str]:
     text_candidates: List[Optional[str]] = [
         follow_info.get("付款方式"),
@@ -570,23 +804,37 @@ def _extract_payment_from_texts(texts: Sequence[Optional[str]]) -> Optional[str]
     return None
 
 
+def _match_payment_label(text: str) -> Optional[str]:
+    best_priority: Optional[int] = None
+    best_label: Optional[str] = None
+    for found in _PAYMENT_PATTERN.finditer(text):
+        needle = found.group(1)
+        priority = _PAYMENT_NEEDLE_PRIORITY[needle]
+        if best_priority is None or priority < best_priority:
+            best_priority = priority
+            best_label = _PAYMENT_NEEDLE_TO_LABEL[needle]
+            if priority == 0:
+                break
+    return best_label
+
+
 def _extract_payment_from_text(text: Optional[str]) -> Optional[str]:
     if not text:
         return None
     normalized = str(text).strip()
     if not normalized:
         return None
-    normalized = normalized.replace("（", "(").replace("）", ")")
-    for needle, label in PAYMENT_KEYWORD_LABELS:
-        if needle and needle in normalized:
-            return label
-    match = re.search(r"\(([^)]+)\)", normalized)
+    normalized = normalized.translate(_FULLWIDTH_PUNCT_TABLE)
+    label = _match_payment_label(normalized)
+    if label:
+        return label
+    match = _PAREN_INNER_RE.search(normalized)
     if match:
         inner = match.group(1).strip()
         if inner:
-            for needle, label in PAYMENT_KEYWORD_LABELS:
-                if needle in inner:
-                    return label
+            label = _match_payment_label(inner)
+            if label:
+                return label
             return inner
     return None
 
@@ -599,9 +847,18 @@ def _parse_follow_date(value: Any) -> Optional[date]:
     text = str(value).strip()
     if not text:
         return None
-    base_part = text.split("T")[0].split(" ")[0].replace("/", "-").strip()
+    return _parse_date_prefix(text)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_date_prefix(text: str) -> Optional[date]:
+    """解析字串開頭的年月日；同一 followTime 會在單次請求中被重複解析，故快取。"""
+    # 直接從字串開頭擷取年月日，省掉 split/replace 的中間字串
+    matched = _DATE_PREFIX_RE.match(text)
+    if not matched:
+        return None
     try:
-        return date.fromisoformat(base_part)
+        return date(int(matched[1]), int(matched[2]), int(matched[3]))
     except ValueError:
         return None
 
@@ -626,13 +883,24 @@ def _select_latest_service_record(records: Sequence[Dict[str, Any]]) -> Optional
     if not parsed_records:
         return records[0] if records else None
 
+    # 只取單一筆，max/min 一趟掃描即可，不需整串排序
     past = [entry for entry in parsed_records if entry[1] <= today]
     if past:
-        past.sort(key=lambda entry: entry[1], reverse=True)
-        return past[0][0]
+        return max(past, key=lambda entry: entry[1])[0]
 
-    parsed_records.sort(key=lambda entry: entry[1])
-    return parsed_records[0][0]
+    return min(parsed_records, key=lambda entry: entry[1])[0]
+
+
+_TASK_TEXT_FIELDS = (
+    "ower_name",
+    "originator_name",
+    "executor_name",
+    "executorAndExecuteStatus",
+    "content",
+    "title",
+    "executor",
+)
+_EXECUTOR_NAME_KEYS = ("executor_name", "ower_name", "originator_name", "name")
 
 
 def _task_contains_keyword(task: Dict[str, Any], keyword: Optional[str]) -> bool:
@@ -640,32 +908,22 @@ def _task_contains_keyword(task: Dict[str, Any], keyword: Optional[str]) -> bool
         return True
 
     keyword = str(keyword)
-    text_fields = (
-        "ower_name",
-        "originator_name",
-        "executor_name",
-        "executorAndExecuteStatus",
-        "content",
-        "title",
-        "executor",
-    )
-    for field in text_fields:
-        value = task.get(field)
-        if isinstance(value, str) and keyword in value:
-            return True
+    # 把所有待檢查的欄位串成一條 haystack，一次 C 層子字串搜尋取代逐欄位比對
+    parts: List[str] = [
+        value for field in _TASK_TEXT_FIELDS if isinstance((value := task.get(field)), str)
+    ]
 
     executors = task.get("executors")
     if isinstance(executors, list):
         for entry in executors:
             if isinstance(entry, dict):
-                for key in ("executor_name", "ower_name", "originator_name", "name"):
-                    val = entry.get(key)
-                    if isinstance(val, str) and keyword in val:
-                        return True
-            elif isinstance(entry, str) and keyword in entry:
-                return True
+                parts.extend(
+                    val for key in _EXECUTOR_NAME_KEYS if isinstance((val := entry.get(key)), str)
+                )
+            elif isinstance(entry, str):
+                parts.append(entry)
 
-    return False
+    return keyword in "\x01".join(parts)
 
 
 def _select_next_service_from_tasks(tasks: Sequence[Dict[str, Any]]) -> Optional[str]:
@@ -740,22 +998,40 @@ def _build_opportunity_plans(
     if isinstance(detail_sources, dict):
         _add_value(detail_sources.get("contractNo"))
 
-    filters: List[tuple[str, Optional[str], Optional[str]]] = []
+    primary_field = getattr(config, "OPPORTUNITY_CUSTOMER_FIELD", "customer.code")
+    primary_operator = getattr(config, "OPPORTUNITY_CUSTOMER_OPERATOR", "eq")
+
+    seen_filters: Set[Tuple[str, str, str]] = set()
+    filters: List[Tuple[str, str, str]] = []
+
+    def _add_filter(value: str, field: str, operator: str) -> None:
+        key = (value, field, operator)
+        if key in seen_filters:
+            return
+        seen_filters.add(key)
+        filters.append(key)
+
     for value in values or [customer_code]:
         if not value:
             continue
-        filters.append((value, getattr(config, "OPPORTUNITY_CUSTOMER_FIELD", "customer.code"), getattr(config, "OPPORTUNITY_CUSTOMER_OPERATOR", "eq")))
+        _add_filter(value, primary_field, primary_operator)
         if value.isdigit():
-            filters.append((value, "customer", "eq"))
+            _add_filter(value, "customer", "eq")
         if len(value) > 3 and not value.isdigit():
-            filters.append((value, "customer.name", "like"))
+            _add_filter(value, "customer.name", "like")
+
+    # 精準過濾器優先（eq 在 like 前、主要欄位在前），命中後不再用寬鬆條件掃描
+    def _filter_priority(entry: Tuple[str, str, str]) -> Tuple[int, int]:
+        _, field, operator = entry
+        return (
+            0 if str(operator).lower() == "eq" else 1,
+            0 if field == primary_field else 1,
+        )
 
-    seen_ids: Set[str] = set()
-    record_list: List[Dict[str, Any]] = []
+    filters.sort(key=_filter_priority)
 
-    for value, field, operator in filters:
-        if not value:
-            continue
+    def _query_opportunities(entry: Tuple[str, str, str]) -> List[Dict[str, Any]]:
+        value, field, operator = entry
         try:
             response = CRM_CLIENT.get_opportunities(
                 value,
@@ -772,25 +1048,43 @@ def _build_opportunity_plans(
                 operator,
                 exc,
             )
-            continue
-        items = response.get("data", {}).get("recordList", []) or []
-        for item in items:
-            key = _clean_text(
-                item.get("id")
-                or item.get("oppt")
-                or item.get("opptId")
-                or item.get("opportunityId")
-                or item.get("code")
-            )
-            if key and key in seen_ids:
-                continue
-            if key:
-                seen_ids.add(key)
-            record_list.append(item)
+            return []
+        return response.get("data", {}).get("recordList", []) or []
+
+    record_list: List[Dict[str, Any]] = []
+    if filters:
+        executor = ThreadPoolExecutor(max_workers=min(8, len(filters)))
+        try:
+            futures = [executor.submit(_query_opportunities, entry) for entry in filters]
+            # 依優先順序取第一個非空結果
+            for future in futures:
+                items = future.result()
+                if items:
+                    record_list = items
+                    break
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
 
     if not record_list:
         return []
 
+    seen_ids: Set[str] = set()
+    deduped: List[Dict[str, Any]] = []
+    for item in record_list:
+        key = _clean_text(
+            item.get("id")
+            or item.get("oppt")
+            or item.get("opptId")
+            or item.get("opportunityId")
+            or item.get("code")
+        )
+        if key and key in seen_ids:
+            continue
+        if key:
+            seen_ids.add(key)
+        deduped.append(item)
+    record_list = deduped
+
     if primary_ids:
         prioritized: List[Dict[str, Any]] = []
         for item in record_list:
@@ -806,8 +1100,7 @@ def _build_opportunity_plans(
         if prioritized:
             record_list = prioritized
 
-    plans: List[Dict[str, Any]] = []
-    for record in record_list:
+    def _fetch_detail(record: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], Optional[str]]:
         opportunity_id = _first_non_empty(
             record.get("id"),
             record.get("oppt"),
@@ -827,6 +1120,14 @@ def _build_opportunity_plans(
                     opportunity_id,
                     exc,
                 )
+        return record, detail_resp_data, opportunity_id
+
+    # 併發抓取商機詳情，N 次串行 RTT 變成一批；executor.map 保持原本順序
+    with ThreadPoolExecutor(max_workers=min(8, len(record_list))) as executor:
+        fetched = list(executor.map(_fetch_detail, record_list))
+
+    plans: List[Dict[str, Any]] = []
+    for record, detail_resp_data, opportunity_id in fetched:
         plan = _build_plan_model(record, detail_resp_data, opportunity_id)
         if plan:
             plans.append(plan)
@@ -841,84 +1142,19 @@ def _build_plan_model(
 ) -> Optional[Dict[str, Any]]:
     sources = _collect_sources(record, detail)
 
-    plan_id = _extract_value(sources, "id", "oppt", "opptId", "opportunityId", "businessId") or opportunity_id
-    title = _extract_value(sources, "oppt_name", "name", "商機名稱")
-    stage = _extract_value(sources, "opptStage_name", "stageName", "商機階段")
-    summary = _extract_value(
-        sources,
-        "planType",
-        "plan_type",
-        "方案類型",
-        "schemeName",
-        "productName",
-        "headDef!define9",
-        "opptDefineCharacter.attrext9",
-    )
-    usage_value = _extract_value(
-        sources,
-        "usage",
-        "useType",
-        "使用方式",
-        "headDef!define8",
-        "opptDefineCharacter.attrext8",
-    )
-    payment_value = _extract_value(
-        sources,
-        "paymentMethod",
-        "paymentMethodName",
-        "paymentWay",
-        "payWay_name",
-        "paywayName",
-        "目前付費方式",
-        "付款方式",
-    )
-    monthly_value = _extract_value(
-        sources,
-        "monthlyFee",
-        "rentAmount",
-        "rent",
-        "月費金額",
-        "headDef!define10",
-        "headDef!define11",
-        "opptDefineCharacter.attrext12",
-        "opptDefineCharacter.attrext10",
-    )
-    contract_number = _extract_value(
-        sources,
-        "contractNo",
-        "contractNumber",
-        "合約編號",
-        "合同編號",
-        "headDef!define13",
-        "opptDefineCharacter.attrext19",
-    )
-    contract_begin = _extract_value(
-        sources,
-        "contractBeginDate",
-        "startDate",
-        "合約開始日期",
-        "開始日期",
-        "headDef!define2",
-        "opptDefineCharacter.attrext2",
-    )
-    contract_end = _extract_value(
-        sources,
-        "contractEndDate",
-        "endDate",
-        "合約結束日期",
-        "結束日期",
-        "headDef!define3",
-        "opptDefineCharacter.attrext3",
-    )
-    contract_term = _extract_value(
-        sources,
-        "contractYear",
-        "合約年期",
-        "headDef!define4",
-        "opptDefineCharacter.attrext4",
-    )
-
-    detail_url = _extract_value(sources, "pcUrl", "detailUrl", "detail_url", "url")
+    plan_id = _extract_value(sources, _PLAN_ID_KEYS) or opportunity_id
+    title = _extract_value(sources, _PLAN_TITLE_KEYS)
+    stage = _extract_value(sources, _PLAN_STAGE_KEYS)
+    summary = _extract_value(sources, _PLAN_SUMMARY_KEYS)
+    usage_value = _extract_value(sources, _PLAN_USAGE_KEYS)
+    payment_value = _extract_value(sources, _PLAN_PAYMENT_KEYS)
+    monthly_value = _extract_value(sources, _PLAN_MONTHLY_KEYS)
+    contract_number = _extract_value(sources, _PLAN_CONTRACT_NO_KEYS)
+    contract_begin = _extract_value(sources, _PLAN_CONTRACT_BEGIN_KEYS)
+    contract_end = _extract_value(sources, _PLAN_CONTRACT_END_KEYS)
+    contract_term = _extract_value(sources, _PLAN_CONTRACT_TERM_KEYS)
+
+    detail_url = _extract_value(sources, _PLAN_DETAIL_URL_KEYS)
     if not detail_url:
         template = getattr(config, "OPPORTUNITY_DETAIL_WEB_URL_TEMPLATE", "")
         if template and plan_id:
@@ -929,75 +1165,34 @@ def _build_plan_model(
 
     details: List[Dict[str, str]] = []
 
-    def _add_detail(label: str, *keys: str) -> None:
-        value = _extract_value(sources, *keys)
+    def _add_detail(label: str, keys: Sequence[str]) -> None:
+        value = _extract_value(sources, keys)
         if value:
             details.append({"label": label, "value": value})
 
     display_summary = summary
     if not display_summary:
-        display_summary = _extract_value(sources, "solutionName", "方案名稱", "planName")
+        display_summary = _extract_value(sources, _PLAN_ALT_SUMMARY_KEYS)
 
     if display_summary:
         details.append({"label": "方案類型", "value": display_summary})
 
-    _add_detail("使用方式", "usage", "useType", "使用方式", "headDef!define8", "opptDefineCharacter.attrext8")
-    _add_detail(
-        "付費方式",
-        "paymentMethod",
-        "paymentMethodName",
-        "paymentWay",
-        "payWay_name",
-        "paywayName",
-        "目前付費方式",
-        "付款方式",
-    )
-    _add_detail("月費金額", "monthlyFee", "rentAmount", "rent", "月費金額", "headDef!define11", "opptDefineCharacter.attrext12")
-    _add_detail("合約編號", "contractNo", "contractNumber", "合同編號", "合約編號", "headDef!define13", "opptDefineCharacter.attrext19")
-    _add_detail("合約開始日", "contractBeginDate", "startDate", "合約開始日期", "開始日期", "headDef!define2", "opptDefineCharacter.attrext2")
-    _add_detail("合約結束日", "contractEndDate", "endDate", "合約結束日期", "結束日期", "headDef!define3", "opptDefineCharacter.attrext3")
-    _add_detail("合約年期", "contractYear", "合約年期", "headDef!define4", "opptDefineCharacter.attrext4")
-    _add_detail("預計簽單金額", "expectSignMoney", "planAmount", "amount", "預計簽單金額")
-    _add_detail("商機階段", "opptStage_name", "stageName", "商機階段")
-    _add_detail("方案負責人", "ownerName", "ower_name", "負責人")
-    _add_detail("交易類型", "opptTransType_name", "bustype_name", "交易類型")
-    _add_detail("安裝位置", "installLocation", "address", "安裝位置")
+    _add_detail("使用方式", _PLAN_USAGE_KEYS)
+    _add_detail("付費方式", _PLAN_PAYMENT_KEYS)
+    _add_detail("月費金額", _PLAN_MONTHLY_DETAIL_KEYS)
+    _add_detail("合約編號", _PLAN_CONTRACT_NO_DETAIL_KEYS)
+    _add_detail("合約開始日", _PLAN_CONTRACT_BEGIN_KEYS)
+    _add_detail("合約結束日", _PLAN_CONTRACT_END_KEYS)
+    _add_detail("合約年期", _PLAN_CONTRACT_TERM_KEYS)
+    _add_detail("預計簽單金額", _PLAN_EXPECT_AMOUNT_KEYS)
+    _add_detail("商機階段", _PLAN_STAGE_KEYS)
+    _add_detail("方案負責人", _PLAN_OWNER_KEYS)
+    _add_detail("交易類型", _PLAN_TRANS_TYPE_KEYS)
+    _add_detail("安裝位置", _PLAN_LOCATION_KEYS)
 
     details = _deduplicate_details(details)
-    if details:
-        preferred_order = [
-            "合約編號",
-            "方案類型",
-            "使用方式",
-            "付費方式",
-            "月費金額",
-            "合約開始日",
-            "合約結束日",
-            "合約年期",
-            "預計簽單金額",
-            "商機階段",
-            "方案負責人",
-            "交易類型",
-            "安裝位置",
-        ]
-        ordered: List[Dict[str, str]] = []
-        seen_pairs: Set[Tuple[str, str]] = set()
-        detail_map = {(item["label"], item["value"]): item for item in details}
-        label_to_items: Dict[str, List[Dict[str, str]]] = {}
-        for item in details:
-            label_to_items.setdefault(item["label"], []).append(item)
-        for label in preferred_order:
-            for entry in label_to_items.get(label, []):
-                key = (entry["label"], entry["value"])
-                if key not in seen_pairs:
-                    ordered.append(entry)
-                    seen_pairs.add(key)
-        for entry in details:
-            key = (entry["label"], entry["value"])
-            if key not in seen_pairs:
-                ordered.append(entry)
-                seen_pairs.add(key)
-        details = ordered
+    # _deduplicate_details 已去重；穩定排序即可還原偏好順序，未知標籤殿後
+    details.sort(key=_preferred_detail_key)
 
     if not (display_summary or title or details):
         return None
@@ -1024,41 +1219,52 @@ def _build_plan_model(
 
 
 
-def _collect_sources(*items: Any) -> List[Dict[str, Any]]:
-    sources: List[Dict[str, Any]] = []
-    seen: Set[int] = set()
-    stack: List[Any] = list(items)
-    while stack:
-        current = stack.pop()
-        if not isinstance(current, dict):
+def _collect_sources(*items: Any) -> Dict[str, str]:
+    """攤平巢狀 dict 為單一索引（先到先得），並同時登錄點號路徑鍵。
+
+    之後 _extract_value 只需做 O(keys) 次 dict 查找，
+    不用每個鍵都重掃整份 sources 清單。
+    """
+    merged: Dict[str, str] = {}
+    seen: Set[Tuple[int, str]] = set()
+    # 廣度優先：後傳入的項目（detail）優先、頂層鍵優先於巢狀鍵；
+    # type() is 比 isinstance 便宜，CRM 回應是純 JSON 容器不會有子類
+    queue: deque[Tuple[Any, str]] = deque((item, "") for item in reversed(items))
+    while queue:
+        current, prefix = queue.popleft()
+        if type(current) is not dict:
             continue
-        marker = id(current)
+        marker = (id(current), prefix)
         if marker in seen:
             continue
         seen.add(marker)
-        sources.append(current)
-        for value in current.values():
-            if isinstance(value, dict):
-                stack.append(value)
-            elif isinstance(value, list):
-                for entry in value:
-                    if isinstance(entry, dict):
-                        stack.append(entry)
-    return sources
-
-
-def _extract_value(sources: Sequence[Dict[str, Any]], *keys: str) -> Optional[str]:
-    for key in keys:
-        if not key:
-            continue
-        for src in sources:
-            if "." in key:
-                value = _extract_nested(src, key)
-            else:
-                value = src.get(key)
+        for key, value in current.items():
+            # 建索引時就清洗成文字，之後 _extract_value 只剩純 dict 查找；
+            # 清不出文字的值不入索引，避免遮蔽更深層的有效值
             text = _clean_text(value)
             if text:
-                return text
+                names = (key, prefix + key) if prefix else (key,)
+                for name in names:
+                    if name not in merged:
+                        merged[name] = text
+            value_type = type(value)
+            if value_type is dict:
+                queue.append((value, f"{prefix}{key}."))
+                # 子 dict 另以自身為錨點重新入列，遞迴下來即登錄所有後綴路徑，
+                # 點號鍵才不受外層信封（data/result 等包裹層）影響
+                if prefix:
+                    queue.append((value, f"{key}."))
+            elif value_type is list:
+                queue.extend((entry, "") for entry in value if type(entry) is dict)
+    return merged
+
+
+def _extract_value(sources: Dict[str, str], keys: Sequence[str]) -> Optional[str]:
+    # 索引值已是清洗後的非空文字，直接取用
+    for key in keys:
+        value = sources.get(key)
+        if value:
+            return value
     return None
 
 
@@ -1082,23 +1288,23 @@ def _deduplicate_details(items: Sequence[Dict[str, str]]) -> List[Dict[str, str]
 
 def _collect_dates_from_texts(texts: Sequence[Optional[str]]) -> List[date]:
     dates: List[date] = []
-    for text in texts:
-        if not text:
+    # 以不可能出現在日期內的分隔符接起所有段落，整批只跑一次 regex
+    blob = "\x00".join(str(text) for text in texts if text)
+    if not blob:
+        return dates
+    for matched in _ANY_DATE_RE.finditer(blob):
+        if matched.group(1):
+            year, month, day = matched.group(1, 2, 3)
+        else:
+            year, month, day = matched.group(4, 5, 6)
+        try:
+            dates.append(date(int(year), int(month), int(day)))
+        except ValueError:
             continue
-        normalized = str(text)
-        for year, month, day in STANDARD_DATE_RE.findall(normalized):
-            try:
-                dates.append(date(int(year), int(month), int(day)))
-            except ValueError:
-                continue
-        for year, month, day in CJK_DATE_RE.findall(normalized):
-            try:
-                dates.append(date(int(year), int(month), int(day)))
-            except ValueError:
-                continue
     return dates
 
 
+@functools.lru_cache(maxsize=4096)
 def _parse_iso_date(value: Optional[str]) -> Optional[date]:
     if not value:
         return None
@@ -1114,7 +1320,7 @@ def _parse_iso_date(value: Optional[str]) -> Optional[date]:
 
 def _resolve_next_service_date(
     latest_service_date: Optional[str],
-   follow_info: Dict[str, str],
+    follow_info: Dict[str, str],
     records: Sequence[Dict[str, Any]],
 ) -> Optional[str]:
     texts: List[Optional[str]] = [
@@ -1134,21 +1340,34 @@ def _resolve_next_service_date(
     if not candidates:
         return None
 
-    unique_dates = sorted(set(candidates))
+    # 單趟累計各優先層級的極值，免去 set + sort 與多次過濾
     latest_obj = _parse_iso_date(latest_service_date)
-    if latest_obj:
-        future_after_latest = [dt for dt in unique_dates if dt > latest_obj]
-        if future_after_latest:
-            if len(future_after_latest) >= 2:
-                return future_after_latest[-1].isoformat()
-            return future_after_latest[0].isoformat()
-
     today = date.today()
-    future_today = [dt for dt in unique_dates if dt >= today]
-    if future_today:
-        return future_today[0].isoformat()
-
-    return unique_dates[-1].isoformat()
+    after_latest_min: Optional[date] = None
+    after_latest_max: Optional[date] = None
+    future_today_min: Optional[date] = None
+    overall_max: Optional[date] = None
+    for dt in candidates:
+        if overall_max is None or dt > overall_max:
+            overall_max = dt
+        if latest_obj and dt > latest_obj:
+            if after_latest_min is None or dt < after_latest_min:
+                after_latest_min = dt
+            if after_latest_max is None or dt > after_latest_max:
+                after_latest_max = dt
+        if dt >= today and (future_today_min is None or dt < future_today_min):
+            future_today_min = dt
+
+    if after_latest_min is not None and after_latest_max is not None:
+        # 多個晚於最近保養日的日期取最遠者，僅一個（極值相等）則取該日
+        if after_latest_min < after_latest_max:
+            return after_latest_max.isoformat()
+        return after_latest_min.isoformat()
+
+    if future_today_min is not None:
+        return future_today_min.isoformat()
+
+    return overall_max.isoformat() if overall_max else None
 
 
 def _resolve_payment_status(records: Sequence[Dict[str, Any]]) -> Optional[str]:
@@ -1177,6 +1396,25 @@ def _resolve_payment_status(records: Sequence[Dict[str, Any]]) -> Optional[str]:
     return date_text
 
 
+def _task_date_owner_pairs(
+    task_records: Sequence[Dict[str, Any]],
+    owner_keyword: Optional[str],
+) -> List[Tuple[date, bool]]:
+    """單趟抽出每筆任務的 (日期, 是否負責人) 對，供兩個分桶函式共用。"""
+    pairs: List[Tuple[date, bool]] = []
+    for task in task_records:
+        task_date = (
+            _parse_follow_date(task.get("startDate"))
+            or _parse_follow_date(task.get("planDate"))
+            or _parse_follow_date(task.get("endDate"))
+        )
+        if not task_date:
+            continue
+        is_owner = bool(owner_keyword and owner_keyword in str(task.get("ower_name") or ""))
+        pairs.append((task_date, is_owner))
+    return pairs
+
+
 def _extract_upcoming_task_date(
     task_records: Sequence[Dict[str, Any]],
     reference_date: date,
@@ -1191,18 +1429,10 @@ def _extract_upcoming_task_date(
     owner_past: List[date] = []
     general_past: List[date] = []
 
-    for task in task_records:
-        task_date: Optional[date] = None
-        for field in ("startDate", "planDate", "endDate"):
-            task_date = _parse_follow_date(task.get(field))
-            if task_date:
-                break
-        if not task_date:
-            continue
+    for task_date, is_owner in _task_date_owner_pairs(task_records, owner_keyword):
         if max_gap_days is not None and task_date - reference_date > timedelta(days=max_gap_days):
             continue
 
-        is_owner = bool(owner_keyword and owner_keyword in str(task.get("ower_name") or ""))
         if task_date >= reference_date:
             if is_owner:
                 owner_future.append(task_date)
@@ -1219,11 +1449,9 @@ def _extract_upcoming_task_date(
     if general_future:
         return min(general_future).isoformat()
     if owner_past:
-        owner_past.sort(reverse=True)
-        return owner_past[0].isoformat()
+        return max(owner_past).isoformat()
     if general_past:
-        general_past.sort(reverse=True)
-        return general_past[0].isoformat()
+        return max(general_past).isoformat()
     return None
 
 
@@ -1244,14 +1472,7 @@ def _select_task_base_date(
     general_future_latest: List[date] = []
     general_past: List[date] = []
 
-    for task in task_records:
-        start = _parse_follow_date(task.get("startDate")) or _parse_follow_date(task.get("planDate"))
-        if not start:
-            start = _parse_follow_date(task.get("endDate"))
-        if not start:
-            continue
-
-        is_owner = bool(owner_keyword and owner_keyword in str(task.get("ower_name") or ""))
+    for start, is_owner in _task_date_owner_pairs(task_records, owner_keyword):
         bucket_future_today = owner_future_today if is_owner else general_future_today
         bucket_future_latest = owner_future_latest if is_owner else general_future_latest
         bucket_past = owner_past if is_owner else general_past
@@ -1272,11 +1493,9 @@ def _select_task_base_date(
     if general_future_latest:
         return min(general_future_latest)
     if owner_past:
-        owner_past.sort(reverse=True)
-        return owner_past[0]
+        return max(owner_past)
     if general_past:
-        general_past.sort(reverse=True)
-        return general_past[0]
+        return max(general_past)
     return previous_date
 
 
@@ -1289,14 +1508,13 @@ def _extract_maintenance_summary(
         followup_data.get("data", {}).get("recordList", []) or []
     )
 
-    maintenance = [
-        item for item in record_list if "維修幫" in str(item.get("ower_name") or "")
-    ]
-
     owner_keyword = getattr(config, "MAINTENANCE_TASK_OWNER_KEYWORD", None)
 
+    # 負責人過濾與日期解析併成同一圈，省掉中間的 maintenance 清單
     parsed_records: List[Tuple[Dict[str, Any], date]] = []
-    for item in maintenance:
+    for item in record_list:
+        if "維修幫" not in str(item.get("ower_name") or ""):
+            continue
         parsed = _parse_follow_date(item.get("followTime"))
         if parsed:
             parsed_records.append((item, parsed))
@@ -1316,7 +1534,7 @@ def _extract_maintenance_summary(
             "customerName": None,
             "latestServiceDate": None,
             "previousServiceDate": None,
-            "nextServiceDate": _date_to_iso(task_date),
+            "nextServiceDate": _date_to_iso(task_date + timedelta(days=14)) if task_date else None,
         }
 
     parsed_records.sort(key=lambda entry: entry[1], reverse=True)
@@ -1350,34 +1568,45 @@ def _extract_maintenance_summary(
         "customerName": customer_name,
         "latestServiceDate": _date_to_iso(latest_date),
         "previousServiceDate": previous_norm,
-        "nextServiceDate": _date_to_iso(next_base_date),
+        # 下次保養日：在基準日上直接加 14 天緩衝，呼叫端不再重新解析調整
+        "nextServiceDate": _date_to_iso(next_base_date + timedelta(days=14)) if next_base_date else None,
     }
 
 
+@functools.lru_cache(maxsize=4096)
 def _seems_like_schedule_text(text: str) -> bool:
-    return bool(STANDARD_DATE_RE.search(text) or CJK_DATE_RE.search(text))
+    return bool(_ANY_DATE_RE.search(text))
 
 
-def _looks_like_phone(text: str) -> bool:
-    # 檢查是否包含中文字符，如果包含則不是電話號碼
-    if any('\u4e00' <= ch <= '\u9fff' for ch in text):
-        return False
-    
-    digits = [ch for ch in text if ch.isdigit()]
-    if len(digits) < 6:
-        return False
-    non_digits = [ch for ch in text if not (ch.isdigit() or ch in {"+", "-", " ", "#"})]
-    return len(non_digits) <= 3
+_PHONE_EXTRA_CHARS = frozenset("+- #")
 
 
+def _looks_like_phone(text: str) -> bool:
+    # 單趟掃描：含中文即非電話，其餘統計數字與雜訊字元並提早退出
+    digits = 0
+    noise = 0
+    for ch in text:
+        if "\u4e00" <= ch <= "\u9fff":
+            return False
+        if ch.isdigit():
+            digits += 1
+        elif ch not in _PHONE_EXTRA_CHARS:
+            noise += 1
+            if noise > 3:
+                return False
+    return digits >= 6
+
+
+@functools.lru_cache(maxsize=4096)
 def _looks_like_customer_code(text: str) -> bool:
     cleaned = str(text or "").strip()
     if not cleaned:
         return False
     upper = cleaned.upper()
-    if CODE_TOKEN_RE.fullmatch(upper):
+    # 標準編碼（C + 至少兩位數字）用純字串判斷，跳過 regex 引擎
+    if len(upper) >= 3 and upper[0] == "C" and upper[1:].isdigit():
         return True
-    normalized = re.sub(r"[\s\-_]", "", upper)
+    normalized = upper.translate(_CODE_STRIP_TABLE)
     if not normalized:
         return False
     if not any(ch.isdigit() for ch in normalized):
@@ -1392,15 +1621,13 @@ def _record_identity(item: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]
     if not code:
         code = _clean_text(_extract_nested(item, "customer.code"))
     
-    # 如果沒有找到客戶編碼，嘗試從customer_name中提取
+    # 如果沒有找到客戶編碼，嘗試從customer_name中提取（如C115）
     if not code:
         customer_name = item.get("customer_name") or item.get("customer.name") or item.get("customerName")
         if customer_name and isinstance(customer_name, str):
-            # 使用正則表達式提取客戶編碼（如C115）
-            import re
-            code_match = re.search(r'\b(C\d+)', customer_name)
+            code_match = _CUSTOMER_CODE_RE.search(customer_name)
             if code_match:
-                code = code_match.group(1)
+                code = code_match.group(0)
     
     name = _clean_text(item.get("customer_name") or item.get("customer.name") or item.get("customerName"))
     if not name:
@@ -1414,80 +1641,28 @@ def _record_identity(item: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]
         or _extract_nested(item, "customer.mobile")
     )
     
-    # 添加調試日誌
-    app.logger.info(f"_record_identity - 原始記錄鍵: {list(item.keys())}")
-    app.logger.info(f"_record_identity - 提取結果: code={code}, name={name}, phone={phone}")
-    
     return code, name, phone
 
 
 def _build_suggestions(records: Sequence[Dict[str, Any]]) -> List[Dict[str, str]]:
-    app.logger.info(f"_build_suggestions - 輸入記錄數量: {len(records)}")
-    
-    suggestions: List[Dict[str, str]] = []
-    seen_codes: Set[str] = set()
-    for i, item in enumerate(records):
-        app.logger.info(f"_build_suggestions - 處理記錄 {i}: {item}")
-        
+    # 直接以大寫編碼當 dict key 去重，省掉額外的 seen 集合
+    seen: Dict[str, Dict[str, str]] = {}
+    for item in records:
         code, name, phone = _record_identity(item)
-        app.logger.info(f"_build_suggestions - 記錄 {i} 身份信息: code={code}, name={name}, phone={phone}")
-        
         if not code:
-            app.logger.info(f"_build_suggestions - 記錄 {i} 跳過，因為沒有客戶編碼")
             continue
         normalized_code = code.upper()
-        if normalized_code in seen_codes:
-            app.logger.info(f"_build_suggestions - 記錄 {i} 跳過，因為編碼 {normalized_code} 已存在")
+        if normalized_code in seen:
             continue
-        seen_codes.add(normalized_code)
         entry: Dict[str, str] = {"code": normalized_code}
         if name:
             entry["name"] = name
         if phone:
             entry["phone"] = phone
-        suggestions.append(entry)
-        app.logger.info(f"_build_suggestions - 添加建議: {entry}")
-    
-    app.logger.info(f"_build_suggestions - 最終建議數量: {len(suggestions)}")
-    return suggestions
+        seen[normalized_code] = entry
 
-
-def _matches_code(
-    item: Dict[str, Any],
-    expected_code: str,
-    detail_cache: Dict[Tuple[str, str], Dict[str, Any]],
-) -> bool:
-    expected = expected_code.strip().upper()
-    if not expected:
-        return False
-
-    for key in ("customer_code", "customerCode"):
-        val = _clean_text(item.get(key))
-        if val and val.upper() == expected:
-            return True
-
-    cust = item.get("customer")
-    if isinstance(cust, str):
-        val = cust.strip().upper()
-        if val and val == expected and _has_alpha(val):
-            return True
-
-    nested_code = _extract_nested(item, "customer.code")
-    if isinstance(nested_code, str) and nested_code.strip().upper() == expected:
-        return True
-
-    for key in ("customer_name", "customer.name", "customerName"):
-        name_val = item.get(key) if "." not in key else _extract_nested(item, key)
-        if isinstance(name_val, str) and name_val:
-            token = CODE_TOKEN_RE.search(name_val.upper())
-            if token and token.group(0) == expected:
-                return True
-
-    detail_code = _detail_code(item, detail_cache)
-    if detail_code and detail_code.upper() == expected:
-        return True
-
-    return False
+    app.logger.debug("_build_suggestions: %s 筆記錄產生 %s 筆建議", len(records), len(seen))
+    return list(seen.values())
 
 
 def _detail_code(
@@ -1524,17 +1699,37 @@ def _get_detail_data(
     if cached is not None:
         return cached
 
+    now = time.time()
+    with _DETAIL_CACHE_LOCK:
+        entry = _DETAIL_CACHE.get(key)
+        if entry and entry[0] > now:
+            detail_cache[key] = entry[1]
+            return entry[1]
+
     detail_resp = CRM_CLIENT.get_customer_detail(customer_id, org_id)
     detail_data = detail_resp.get("data") or {}
     detail_cache[key] = detail_data
+    with _DETAIL_CACHE_LOCK:
+        if len(_DETAIL_CACHE) >= _DETAIL_CACHE_MAX_ENTRIES:
+            expired = [k for k, (expires_at, _) in _DETAIL_CACHE.items() if expires_at <= now]
+            for stale in expired:
+                _DETAIL_CACHE.pop(stale, None)
+            if len(_DETAIL_CACHE) >= _DETAIL_CACHE_MAX_ENTRIES:
+                _DETAIL_CACHE.clear()
+        _DETAIL_CACHE[key] = (now + CUSTOMER_DETAIL_CACHE_TTL_SECONDS, detail_data)
     return detail_data
 
 
+@functools.lru_cache(maxsize=256)
+def _split_path(path: str) -> Tuple[str, ...]:
+    return tuple(path.split('.'))
+
+
 def _extract_nested(source: Dict[str, Any], path: str) -> Any:
     if not path:
         return None
     current: Any = source
-    for part in path.split('.'):
+    for part in _split_path(path):
         if not isinstance(current, dict):
             return None
         current = current.get(part)
@@ -1543,11 +1738,24 @@ def _extract_nested(source: Dict[str, Any], path: str) -> Any:
     return current
 
 
+@functools.lru_cache(maxsize=4096)
 def _has_alpha(text: str) -> bool:
     return any(ch.isalpha() for ch in text)
 
 
 
+def _index_records_by_date(
+    records: Sequence[Dict[str, Any]],
+) -> Dict[date, Dict[str, Any]]:
+    """依跟進日期建索引，同日多筆時保留最先出現的一筆。"""
+    index: Dict[date, Dict[str, Any]] = {}
+    for item in records:
+        record_date = _parse_follow_date(item.get("followTime") or item.get("followUpTime"))
+        if record_date and record_date not in index:
+            index[record_date] = item
+    return index
+
+
 def _find_record_by_date(
     records: Sequence[Dict[str, Any]],
     iso_date: Optional[str],
@@ -1557,11 +1765,36 @@ def _find_record_by_date(
     target = _parse_follow_date(iso_date)
     if not target:
         return None
+    return _index_records_by_date(records).get(target)
+
+
+def _prefetch_details(
+    records: Sequence[Dict[str, Any]],
+    detail_cache: Dict[Tuple[str, str], Dict[str, Any]],
+) -> None:
+    """並行預抓缺漏的客戶詳情，讓後續 _detail_code 全數命中快取。"""
+    missing: Set[Tuple[str, str]] = set()
     for item in records:
-        record_date = _parse_follow_date(item.get("followTime") or item.get("followUpTime"))
-        if record_date == target:
-            return item
-    return None
+        cust_id = item.get("customer")
+        org_id = item.get("org")
+        if not cust_id or not org_id:
+            continue
+        key = (str(cust_id), str(org_id))
+        if key not in detail_cache:
+            missing.add(key)
+    if not missing:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(8, len(missing))) as executor:
+        futures = {
+            executor.submit(_get_detail_data, cust_id, org_id, detail_cache): (cust_id, org_id)
+            for cust_id, org_id in missing
+        }
+        for future, key in futures.items():
+            try:
+                future.result()
+            except Exception:  # pragma: no cover - 失敗時留空讓後續邏輯略過
+                detail_cache[key] = {}
 
 
 def _filter_records_for_code(
@@ -1573,18 +1806,21 @@ def _filter_records_for_code(
     if not expected:
         return list(records), None, []
 
-    exact_records = [
-        item for item in records
-        if _matches_code(item, expected, detail_cache)
+    _prefetch_details(records, detail_cache)
+
+    # 每筆記錄的候選編碼只抽一次（可能觸發詳情查詢），精準比對與彙整共用
+    per_record: List[Tuple[Dict[str, Any], List[str]]] = [
+        (item, _candidate_codes(item, detail_cache)) for item in records
     ]
+
+    exact_records = [item for item, codes in per_record if expected in codes]
     if exact_records:
         return exact_records, expected, []
 
     code_to_records: Dict[str, List[Dict[str, Any]]] = {}
-    for item in records:
-        for code in _candidate_codes(item, detail_cache):
-            key = code.upper()
-            code_to_records.setdefault(key, []).append(item)
+    for item, codes in per_record:
+        for code in codes:
+            code_to_records.setdefault(code, []).append(item)
 
     if expected in code_to_records:
         return code_to_records[expected], expected, []
@@ -1608,23 +1844,47 @@ def _candidate_codes(
     item: Dict[str, Any],
     detail_cache: Dict[Tuple[str, str], Dict[str, Any]],
 ) -> List[str]:
+    # 候選編碼通常只有兩三個，直接線性比對去重比建 dict 便宜
     codes: List[str] = []
+
+    def _push(code: str) -> None:
+        if code not in codes:
+            codes.append(code)
+
     for key in ("customer_code", "customerCode"):
         val = _clean_text(item.get(key))
         if val:
-            codes.append(val.upper())
+            _push(val.upper())
+
+    cust = item.get("customer")
+    if isinstance(cust, str):
+        val = cust.strip().upper()
+        if val and _has_alpha(val):
+            _push(val)
+
+    nested_code = _extract_nested(item, "customer.code")
+    if isinstance(nested_code, str) and nested_code.strip():
+        _push(nested_code.strip().upper())
+
+    # 三個平面名稱鍵與巢狀 customer.name 都要掃，編碼可能只藏在其中一個
+    for name_key in ("customer_name", "customer.name", "customerName"):
+        name_val = _clean_text(item.get(name_key))
+        if name_val:
+            token = CODE_TOKEN_RE.search(name_val.upper())
+            if token:
+                _push(token.group(0))
 
-    name_val = _clean_text(item.get("customer_name") or item.get("customer.name") or item.get("customerName"))
-    if name_val:
-        token = CODE_TOKEN_RE.search(name_val.upper())
+    nested_name = _extract_nested(item, "customer.name")
+    if isinstance(nested_name, str) and nested_name.strip():
+        token = CODE_TOKEN_RE.search(nested_name.upper())
         if token:
-            codes.append(token.group(0))
+            _push(token.group(0))
 
     detail = _detail_code(item, detail_cache)
     if detail:
-        codes.append(detail.upper())
+        _push(detail.upper())
 
-    return list(dict.fromkeys(codes))  # preserve order, remove duplicates
+    return codes
 
 
 if __name__ == "__main__":  # pragma: no cover